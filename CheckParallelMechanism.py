@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+''' This script checks the SharedMemoryPool class against the serial FourBarMechanism class. Run it after changing either of them:
+it raises an AssertionError if something is wrong and prints "All checks passed" otherwise. '''
+
+from FourBarMechanism import FourBarMechanism
+from ParallelMechanism import SharedMemoryPool, FIELDS
+from multiprocessing import Lock
+from contextlib import redirect_stdout
+from math import pi
+import ParallelMechanism
+import threading
+import time
+import io
+import numpy as np
+
+
+# Double rocker (the coupler is the shortest link), so link 2 can't turn all the way around and part of the trajectory is NaN
+LINKAGE = (100, 90, 40, 60) # L1, L2, L3, L4
+OMEGA2 = 10
+ALPHA2 = 5
+RPA = 30
+DELTA3 = pi/6
+
+PROCESSES = 4
+
+
+def solveSerial(theta2):
+    '''Solves the trajectory one angle at a time with FourBarMechanism. Unreachable positions are NaN.'''
+
+    sol = {name: np.full((theta2.size,) if branches == 1 else (theta2.size, branches), np.nan, dtype = dtype)
+           for name, dtype, branches in FIELDS}
+
+    for row, angle in enumerate(theta2):
+        try:
+            with redirect_stdout(io.StringIO()):
+                mech = FourBarMechanism(*LINKAGE, float(angle), OMEGA2, ALPHA2, RPA, DELTA3)
+        except ValueError:
+            continue
+
+        for name, _, _ in FIELDS:
+            sol[name][row] = getattr(mech, name)
+
+    return sol
+
+
+def checkAgainstSerial(pool, theta2):
+    '''Checks that the pool gives the same results as the serial solution, NaN rows included.'''
+
+    serial = solveSerial(theta2)
+    parallel = pool.solveTrajectory(*LINKAGE, theta2, OMEGA2, ALPHA2, RPA, DELTA3)
+
+    for name, _, _ in FIELDS:
+        np.testing.assert_array_equal(parallel[name], serial[name], err_msg = name)
+
+    assert sum(pool.chunksSolved) == -(-theta2.size // pool.chunkSize), "every chunk should be solved exactly once"
+
+    return np.isnan(serial['Rb'][:, 0]).sum()
+
+
+def checkStealing():
+    '''Checks chunk claiming and stealing directly, with worker 0 starting with no chunks and worker 1 owning chunks 0 to 3.'''
+
+    locks = [Lock(), Lock()]
+    bounds = [0, 0, 0, 4] # [start, end) of worker 0, then of worker 1
+
+    assert ParallelMechanism._claimChunk(0, bounds, locks) is None, "worker 0 should have no chunks of its own"
+    assert ParallelMechanism._stealChunks(0, bounds, locks), "worker 0 should steal from worker 1"
+    assert bounds == [2, 4, 0, 2], f"worker 0 should take the upper half of worker 1's chunks, got bounds {bounds}"
+
+    claimed = [ParallelMechanism._claimChunk(k, bounds, locks) for k in (0, 0, 1, 1)]
+    assert claimed == [2, 3, 0, 1], f"unexpected chunks claimed: {claimed}"
+
+    assert ParallelMechanism._claimChunk(0, bounds, locks) is None
+    assert ParallelMechanism._claimChunk(1, bounds, locks) is None
+    assert not ParallelMechanism._stealChunks(0, bounds, locks), "there should be nothing left to steal"
+
+
+def closeAfterWorkerDied(workerId):
+    '''Kills an idle worker and leaves the with block without calling solve().'''
+
+    with SharedMemoryPool(processes = PROCESSES) as pool:
+        time.sleep(1) # Lets every worker start and wait for a job
+        pool._workers[workerId].terminate()
+        pool._workers[workerId].join()
+
+
+def interrupt(sequence):
+    '''Replaces SharedMemoryPool._waitWorkers to simulate a call interrupted while the workers are running.'''
+
+    raise KeyboardInterrupt
+
+
+if __name__ == '__main__':
+
+    checkStealing()
+
+    theta2 = np.linspace(0, 2*pi, 2001)
+
+    # chunkSize = 1 makes plenty of chunks to steal near the end of the long trajectory, and the short one has fewer chunks than
+    # workers, so some workers start with no chunks. The same pool is reused for every call.
+    with SharedMemoryPool(processes = PROCESSES, chunkSize = 1) as pool:
+        unreachable = checkAgainstSerial(pool, theta2)
+        assert 0 < unreachable < theta2.size, "trajectory should be only partially reachable"
+
+        checkAgainstSerial(pool, theta2[:PROCESSES - 1])
+        checkAgainstSerial(pool, theta2[::7])
+
+    # A call interrupted while the workers are running breaks the pool, instead of letting the next call read stale results
+    with SharedMemoryPool(processes = PROCESSES, chunkSize = 1) as pool:
+        pool._waitWorkers = interrupt
+
+        try:
+            pool.solveTrajectory(*LINKAGE, theta2, OMEGA2, ALPHA2, RPA, DELTA3)
+            raise AssertionError("interrupted call should raise")
+        except KeyboardInterrupt:
+            pass
+
+        try:
+            pool.solveTrajectory(*LINKAGE, theta2, OMEGA2, ALPHA2, RPA, DELTA3)
+            raise AssertionError("pool should be unusable after an interrupted call")
+        except RuntimeError:
+            pass
+
+    # Same when a worker dies
+    with SharedMemoryPool(processes = PROCESSES, chunkSize = 1) as pool:
+        pool._workers[0].terminate()
+        pool._workers[0].join()
+
+        for _ in range(2):
+            try:
+                pool.solveTrajectory(*LINKAGE, theta2, OMEGA2, ALPHA2, RPA, DELTA3)
+                raise AssertionError("pool should be unusable after a worker died")
+            except RuntimeError:
+                pass
+
+    # Closing the pool must not hang when a worker died while it was idle. One of the idle workers holds the job queue's lock, and
+    # there's no telling which, so each of them is killed in turn
+    for workerId in range(PROCESSES):
+        closer = threading.Thread(target = closeAfterWorkerDied, args = (workerId,), daemon = True)
+        closer.start()
+        closer.join(15)
+        assert not closer.is_alive(), f"closing the pool hung after worker {workerId} died"
+
+    print("All checks passed")
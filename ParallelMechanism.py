@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+''' Evaluates many FourBarMechanism states in parallel. Workers write their results straight into multiprocessing.shared_memory
+buffers instead of pickling them back to the parent process, which for large trajectories and parameter sweeps costs more
+than the computation itself.
+
+Example:
+
+    from ParallelMechanism import SharedMemoryPool
+    from math import pi
+    import numpy as np
+
+    if __name__ == '__main__': # Required, since worker processes may import this script again
+        with SharedMemoryPool() as pool:
+            sol = pool.solveTrajectory(152.4, 50.8, 177.8, 228.6, np.linspace(0, 2*pi, 100000), 10, 0, 152.4, pi/6)
+
+        sol['Rb'][:, 0] # Positions of node B, open mechanism
+'''
+
+from multiprocessing import Array, Lock, Process, Queue, cpu_count, resource_tracker, shared_memory
+from contextlib import redirect_stdout
+from queue import Empty
+import io
+import os
+import time
+import numpy as np
+
+from FourBarMechanism import FourBarMechanism
+
+
+# Columns of an input row, in the same order as the FourBarMechanism constructor arguments
+INPUT_COLUMNS = ('L1', 'L2', 'L3', 'L4', 'theta2', 'omega2', 'alpha2', 'Rpa', 'delta3')
+
+# Results written to shared memory: (FourBarMechanism attribute, dtype, number of branches). Fields with 2 branches hold the
+# open (index 0) and closed (index 1) mechanism values, just like the FourBarMechanism tuples.
+FIELDS = (
+        ('Ra', np.complex128, 1),
+        ('Va', np.complex128, 1),
+        ('Aa', np.complex128, 1),
+        ('Rb', np.complex128, 2),
+        ('Rp', np.complex128, 2),
+        ('Vb', np.complex128, 2),
+        ('Vpa', np.complex128, 2),
+        ('Ab', np.complex128, 2),
+        ('Apa', np.complex128, 2),
+        ('theta3', np.float64, 2),
+        ('theta4', np.float64, 2),
+        ('omega3', np.float64, 2),
+        ('omega4', np.float64, 2),
+        ('alpha3', np.float64, 2),
+        ('alpha4', np.float64, 2)
+        )
+
+
+def _availableCpus():
+    '''Number of CPUs this process may run on, which is less than the machine's when it is pinned to some cores.'''
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError: # Not available on Windows and macOS
+        return cpu_count()
+
+
+def _fieldShape(n, branches):
+    '''Shape of the result array of a field for n input rows.'''
+
+    return (n,) if branches == 1 else (n, branches)
+
+
+def _attach(name, shape, dtype):
+    '''Attaches to an existing shared memory block and returns it along with a numpy view of it.'''
+
+    shm = shared_memory.SharedMemory(name = name)
+
+    return shm, np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+
+
+def _claimChunk(workerId, bounds, locks):
+    '''Claims the next chunk of the worker's own range. Returns None if the range is exhausted.'''
+
+    with locks[workerId]:
+        start, end = bounds[2*workerId], bounds[2*workerId + 1]
+
+        if start < end:
+            bounds[2*workerId] = start + 1
+            return start
+
+    return None
+
+
+def _stealChunks(workerId, bounds, locks):
+    '''Steals the upper half of the unclaimed chunks of another worker and makes it the thief's own range. Victims are visited
+    starting from the worker's neighbour so that thieves spread out. Returns False if there was nothing left to steal.'''
+
+    workers = len(locks)
+
+    for offset in range(1, workers):
+        victim = (workerId + offset) % workers
+
+        with locks[victim]:
+            start, end = bounds[2*victim], bounds[2*victim + 1]
+
+            if start >= end:
+                continue
+
+            mid = end - (end - start + 1)//2
+            bounds[2*victim + 1] = mid
+
+        with locks[workerId]:
+            bounds[2*workerId] = mid
+            bounds[2*workerId + 1] = end
+
+        return True
+
+    return False
+
+
+def _solveRows(inputs, outputs, start, stop, cache):
+    '''Solves the input rows [start, stop) and writes the results into the output arrays. Rows describing a mechanism that can't
+    be assembled at that theta2 are left as NaN. The last mechanism instantiated is kept in cache and reused for rows with the same
+    geometry, so trajectories only call updateTheta2.'''
+
+    for row in range(start, stop):
+        # Python floats, so the math behaves as in the serial code (ZeroDivisionError instead of numpy's inf/NaN and warnings)
+        L1, L2, L3, L4, theta2, omega2, alpha2, Rpa, delta3 = map(float, inputs[row])
+        geometry = (L1, L2, L3, L4, Rpa, delta3)
+
+        try:
+            if cache.get('geometry') == geometry:
+                mech = cache['mech']
+                mech.omega2 = omega2
+                mech.alpha2 = alpha2
+                mech.updateTheta2(theta2)
+            else:
+                cache.clear()
+
+                # The constructor prints a warning for Grashof mechanisms, which would be repeated by every worker on every chunk
+                with redirect_stdout(io.StringIO()):
+                    mech = FourBarMechanism(L1, L2, L3, L4, theta2, omega2, alpha2, Rpa, delta3)
+
+                cache['geometry'] = geometry
+                cache['mech'] = mech
+        except (ValueError, ZeroDivisionError): # Position not reachable (negative discriminant) or degenerate linkage (zero length link)
+            continue
+
+        for name, _, _ in FIELDS:
+            outputs[name][row] = getattr(mech, name)
+
+
+def _runJob(workerId, job, bounds, locks):
+    '''Attaches to the job's shared memory blocks and solves chunks until there is none left to claim or steal.
+    Returns the number of chunks solved by this worker.'''
+
+    names, n, chunkSize = job
+    blocks = []
+    solved = 0
+
+    try:
+        shm, inputs = _attach(names['inputs'], (n, len(INPUT_COLUMNS)), np.float64)
+        blocks.append(shm)
+
+        outputs = {}
+        for name, dtype, branches in FIELDS:
+            shm, outputs[name] = _attach(names[name], _fieldShape(n, branches), dtype)
+            blocks.append(shm)
+
+        cache = {}
+
+        while True:
+            chunk = _claimChunk(workerId, bounds, locks)
+
+            if chunk is None:
+                if _stealChunks(workerId, bounds, locks):
+                    continue
+                break
+
+            _solveRows(inputs, outputs, chunk * chunkSize, min(n, (chunk + 1) * chunkSize), cache)
+            solved += 1
+    finally:
+        # Views must be released before closing the blocks, otherwise the buffers are still exported
+        inputs = outputs = None
+        for shm in blocks:
+            shm.close()
+
+    return solved
+
+
+def _worker(workerId, jobs, done, bounds, locks):
+    '''Main loop of a pool process. Waits for jobs until it receives None.'''
+
+    while True:
+        job = jobs.get()
+
+        if job is None:
+            break
+
+        sequence, job = job
+
+        try:
+            done.put((sequence, workerId, _runJob(workerId, job, bounds, locks), None))
+        except Exception as error:
+            done.put((sequence, workerId, 0, repr(error)))
+
+
+class SharedMemoryPool:
+
+    '''Reusable pool of worker processes that solve FourBarMechanism states in parallel.
+
+    Each call to solve() places the inputs and one result buffer per field (see FIELDS) in shared memory. The rows are split in
+    chunks of chunkSize rows, and each worker initially owns a contiguous range of chunks. Workers write the results of a chunk
+    directly to the rows it covers, so nothing but a chunk count goes back through a pipe. A worker that runs out of chunks steals
+    the upper half of the remaining chunks of another worker, which keeps all processes busy when some chunks are slower than others.
+
+    The processes are started once and reused between calls. Call close() (or use the pool as a context manager) to stop them.
+    If a call is interrupted or a worker dies, the workers are terminated and later calls raise RuntimeError.
+
+    Worker processes may import the main script again (always with the spawn and forkserver start methods, the defaults on Windows,
+    macOS and Python 3.14+ on Linux), so the pool must be created under an if __name__ == '__main__': guard.'''
+
+    def __init__(self, processes = None, chunkSize = 256):
+        '''Starts the worker processes. processes defaults to the number of CPUs this process is allowed to use.'''
+
+        if processes is None:
+            processes = _availableCpus()
+
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+
+        if chunkSize < 1:
+            raise ValueError("chunkSize must be at least 1")
+
+        self.processes = processes
+        self.chunkSize = chunkSize
+
+        self._jobs = Queue()
+        self._done = Queue()
+        self._bounds = Array('q', 2 * processes, lock = False) # [start, end) range of unclaimed chunks of each worker
+        self._locks = [Lock() for _ in range(processes)]
+        self._sequence = 0 # Id of the last job, so stale done messages are never taken for the current job's
+        self.chunksSolved = [0] * processes # Number of chunks each worker solved in the last call
+
+        # Workers must share the parent's resource tracker. Otherwise each one starts its own when attaching to a block, and it
+        # reports the block as leaked (and tries to unlink it again) when the worker exits
+        resource_tracker.ensure_running()
+
+        self._workers = [Process(target = _worker, args = (k, self._jobs, self._done, self._bounds, self._locks), daemon = True)
+                         for k in range(processes)]
+
+        for p in self._workers:
+            p.start()
+
+    def _distributeChunks(self, nChunks):
+        '''Assigns each worker a contiguous range of chunks of (almost) the same size.'''
+
+        for k in range(self.processes):
+            self._bounds[2*k] = k * nChunks // self.processes
+            self._bounds[2*k + 1] = (k + 1) * nChunks // self.processes
+
+    def _checkWorkers(self):
+        '''Raises RuntimeError if any worker process has died. Live workers can pick up a dead one's job message and chunks, so a
+        job finishing isn't enough to tell that all of them are still there.'''
+
+        if not all(p.is_alive() for p in self._workers):
+            raise RuntimeError("A worker process died unexpectedly. The pool can't be used anymore.")
+
+    def _waitWorkers(self, sequence):
+        '''Waits for every worker to report the end of job sequence. Returns the errors they reported and the number of chunks
+        each of them solved. Raises RuntimeError if any of them died.'''
+
+        errors = []
+        counts = [0] * self.processes
+        pending = self.processes
+
+        while pending:
+            try:
+                jobSequence, workerId, solved, error = self._done.get(timeout = 1)
+            except Empty:
+                self._checkWorkers()
+                continue
+
+            if jobSequence != sequence:
+                continue
+
+            pending -= 1
+            counts[workerId] += solved # A worker may pick up the job message twice, if it's faster than another worker
+            if error is not None:
+                errors.append(f'worker {workerId}: {error}')
+
+        return errors, counts
+
+    def _terminate(self):
+        '''Kills the worker processes, leaving the pool unusable.'''
+
+        for p in self._workers:
+            p.terminate()
+
+        for p in self._workers:
+            p.join()
+
+        self._workers = None
+
+    def solve(self, inputs):
+        '''Solves every row of inputs, an (N, 9) array whose columns are given by INPUT_COLUMNS (the FourBarMechanism constructor
+        arguments). Returns a dictionary mapping each field name in FIELDS to an array of shape (N,) or (N, 2). Rows whose position
+        can't be assembled are NaN.'''
+
+        if self._workers is None:
+            raise RuntimeError("Pool has been closed, or broken by an interrupted call.")
+
+        inputs = np.ascontiguousarray(inputs, dtype = np.float64)
+
+        if inputs.ndim != 2 or inputs.shape[1] != len(INPUT_COLUMNS):
+            raise ValueError(f"inputs must have shape (N, {len(INPUT_COLUMNS)}), got {inputs.shape}")
+
+        n = inputs.shape[0]
+
+        if n == 0:
+            self.chunksSolved = [0] * self.processes
+            return {name: np.empty(_fieldShape(0, branches), dtype = dtype) for name, dtype, branches in FIELDS}
+
+        blocks = {}
+
+        try:
+            blocks['inputs'] = shared_memory.SharedMemory(create = True, size = inputs.nbytes)
+            np.ndarray(inputs.shape, dtype = np.float64, buffer = blocks['inputs'].buf)[:] = inputs
+
+            for name, dtype, branches in FIELDS:
+                shape = _fieldShape(n, branches)
+                blocks[name] = shared_memory.SharedMemory(create = True, size = int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                np.ndarray(shape, dtype = dtype, buffer = blocks[name].buf).fill(np.nan)
+
+            nChunks = -(-n // self.chunkSize)
+            self._sequence += 1
+            job = (self._sequence, ({name: shm.name for name, shm in blocks.items()}, n, self.chunkSize))
+
+            try:
+                self._checkWorkers()
+                self._distributeChunks(nChunks)
+
+                for _ in range(self.processes):
+                    self._jobs.put(job)
+
+                errors, counts = self._waitWorkers(self._sequence)
+                self._checkWorkers()
+            except BaseException:
+                # Workers may still be running this job and using the chunk bounds, so the pool can't take another one
+                self._terminate()
+                raise
+
+            if errors:
+                raise RuntimeError("Parallel evaluation failed. " + "; ".join(errors))
+
+            if sum(counts) != nChunks:
+                raise RuntimeError(f"Workers solved {sum(counts)} chunks out of {nChunks}.")
+
+            self.chunksSolved = counts
+
+            # Copying out is a plain memcpy, and lets the shared memory blocks be released right away
+            return {name: np.ndarray(_fieldShape(n, branches), dtype = dtype, buffer = blocks[name].buf).copy()
+                    for name, dtype, branches in FIELDS}
+        finally:
+            for shm in blocks.values():
+                shm.close()
+                shm.unlink()
+
+    def solveTrajectory(self, L1, L2, L3, L4, theta2, omega2 = 0, alpha2 = 0, Rpa = 0, delta3 = 0):
+        '''Solves a single mechanism for every theta2 angle in the theta2 array. Arguments are the same as the FourBarMechanism
+        constructor's. omega2 and alpha2 may also be arrays with the same length as theta2.'''
+
+        theta2 = np.asarray(theta2, dtype = np.float64).ravel()
+
+        inputs = np.empty((theta2.size, len(INPUT_COLUMNS)))
+        inputs[:] = (L1, L2, L3, L4, 0, 0, 0, Rpa, delta3)
+        inputs[:, 4] = theta2
+        inputs[:, 5] = omega2
+        inputs[:, 6] = alpha2
+
+        return self.solve(inputs)
+
+    def close(self, timeout = 5):
+        '''Stops the worker processes. Workers still running after timeout seconds are killed.'''
+
+        if self._workers is None:
+            return
+
+        # A worker that died while waiting for a job may have taken the job queue's lock with it, so the others would never get
+        # their stop message
+        try:
+            self._checkWorkers()
+        except RuntimeError:
+            self._terminate()
+            return
+
+        for _ in self._workers:
+            self._jobs.put(None)
+
+        deadline = time.monotonic() + timeout
+        for p in self._workers:
+            p.join(max(0, deadline - time.monotonic()))
+
+        if any(p.is_alive() for p in self._workers):
+            self._terminate()
+            return
+
+        self._workers = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()